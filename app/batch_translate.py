@@ -0,0 +1,146 @@
+"""
+Batch $translate: many NAMASTE codings in one POST.
+
+Codings arrive either as a FHIR Parameters resource with repeated 'coding'
+parameters or as NDJSON (one coding per line). They are resolved in chunks
+of TRANSLATE_BATCH_SIZE, one set-based query per chunk, and each result is
+streamed back as one NDJSON line in input order, so a back-fill of 100k
+codes is a single request instead of 100k.
+"""
+import os
+import time
+from dataclasses import dataclass
+from typing import AsyncIterable, AsyncIterator, Iterable
+
+import orjson
+
+from . import crud, fhir_utils
+from .database import AsyncSessionLocal
+
+# Codings resolved per query
+TRANSLATE_BATCH_SIZE = int(os.getenv("TRANSLATE_BATCH_SIZE", "1000"))
+
+# Accepted source systems, by short name or URI -> NAMASTE sub-system
+NAMASTE_SYSTEMS = {}
+for _name, _uri in fhir_utils.SYSTEM_URIS.items():
+    if _name.startswith("namaste_"):
+        NAMASTE_SYSTEMS[_name] = NAMASTE_SYSTEMS[_uri] = _name.split("_", 1)[1]
+
+
+class InvalidBatch(ValueError):
+    """Raised when a Parameters body can't be read as a batch of codings."""
+
+
+@dataclass(frozen=True)
+class SourceCoding:
+    system: str | None
+    code: str | None
+    error: str | None = None
+
+
+def _source_coding(value) -> SourceCoding:
+    if not isinstance(value, dict) or not value.get("system") or not value.get("code"):
+        return SourceCoding(None, None, error="Expected a coding with 'system' and 'code'")
+    return SourceCoding(str(value["system"]), str(value["code"]))
+
+
+def codings_from_parameters(resource) -> list[SourceCoding]:
+    if not isinstance(resource, dict) or resource.get("resourceType") != "Parameters":
+        raise InvalidBatch("Expected a FHIR Parameters resource")
+    codings = [
+        _source_coding(parameter.get("valueCoding"))
+        for parameter in resource.get("parameter") or []
+        if isinstance(parameter, dict) and parameter.get("name") == "coding"
+    ]
+    if not codings:
+        raise InvalidBatch("No 'coding' parameters given")
+    return codings
+
+
+def _parse_line(line: bytes) -> SourceCoding:
+    try:
+        return _source_coding(orjson.loads(line))
+    except orjson.JSONDecodeError:
+        return SourceCoding(None, None, error="Invalid JSON line")
+
+
+async def codings_from_ndjson(chunks: AsyncIterable[bytes]) -> AsyncIterator[SourceCoding]:
+    """Parses NDJSON codings as the body arrives, without buffering all of it."""
+    pending = b""
+    async for chunk in chunks:
+        *lines, pending = (pending + chunk).split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _parse_line(line)
+    if pending.strip():
+        yield _parse_line(pending)
+
+
+async def _batches(codings: AsyncIterable[SourceCoding] | Iterable[SourceCoding], size: int):
+    batch = []
+    if not hasattr(codings, "__aiter__"):
+        codings = _aiter(codings)
+    async for coding in codings:
+        batch.append(coding)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+def _result(coding: SourceCoding, mappings: dict) -> dict:
+    """The $translate output Parameters for one coding, as a plain dict."""
+    parameters = []
+    if coding.error is None:
+        parameters.append({"name": "sourceCoding", "valueCoding": {"system": coding.system, "code": coding.code}})
+
+    mapping = None
+    if coding.error is not None:
+        message = coding.error
+    elif coding.system not in NAMASTE_SYSTEMS:
+        message = f"Translation only supported from a NAMASTE system, not '{coding.system}'"
+    else:
+        mapping = mappings.get((NAMASTE_SYSTEMS[coding.system], coding.code))
+        message = f"No translation found for code '{coding.code}'"
+
+    if mapping is None or mapping.icd_term is None:
+        parameters += [{"name": "result", "valueBoolean": False}, {"name": "message", "valueString": message}]
+    else:
+        parameters += [
+            {"name": "result", "valueBoolean": True},
+            {"name": "match", "part": [
+                {"name": "relationship", "valueCode": mapping.map_relationship},
+                {"name": "concept", "valueCoding": {
+                    "system": fhir_utils.SYSTEM_URIS["icd11"],
+                    "code": mapping.icd_term.code,
+                    "display": mapping.icd_term.term,
+                }},
+            ]},
+        ]
+    return {"resourceType": "Parameters", "parameter": parameters}
+
+
+async def translate_stream(codings) -> AsyncIterator[bytes]:
+    """
+    Yields one NDJSON line per coding. Opens its own session, since the
+    response is still streaming after the request's dependencies have exited.
+    """
+    started, total = time.perf_counter(), 0
+    async with AsyncSessionLocal() as db:
+        async for batch in _batches(codings, TRANSLATE_BATCH_SIZE):
+            pairs = {
+                (NAMASTE_SYSTEMS[coding.system], coding.code)
+                for coding in batch
+                if coding.error is None and coding.system in NAMASTE_SYSTEMS
+            }
+            mappings = await crud.get_mappings_for_namaste_codes(db, pairs)
+            yield b"".join(orjson.dumps(_result(coding, mappings)) + b"\n" for coding in batch)
+            total += len(batch)
+    elapsed = time.perf_counter() - started
+    print(f"Batch $translate: {total} codes in {elapsed:.2f}s ({total / max(elapsed, 1e-9):.0f} codes/s)")
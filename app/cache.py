@@ -0,0 +1,156 @@
+"""
+Caches for the translation and code-lookup hot paths ($translate, /map,
+$lookup and /fhir/condition).
+
+Entries are plain snapshots of the rows, keyed by (system, code), so they
+can outlive the session that loaded them. Curation edits invalidate the
+affected keys directly (see crud.update_map / crud.delete_map); reloads by
+the ingestion scripts are picked up through table_versions and clear the
+caches that depend on the reloaded tables.
+"""
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from .table_versions import VersionWatcher
+
+CACHE_SIZE = int(os.getenv("LOOKUP_CACHE_SIZE", "50000"))
+CACHE_TTL = float(os.getenv("LOOKUP_CACHE_TTL_SECONDS", "3600"))
+REFRESH_INTERVAL = float(os.getenv("LOOKUP_CACHE_REFRESH_SECONDS", "10"))
+
+# Returned by LRUCache.get when a key is absent; None is a valid cached value.
+MISSING = object()
+
+
+class LRUCache:
+    """
+    A size-bounded LRU cache whose entries also expire after `ttl` seconds
+    (never, if `ttl` is None).
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float | None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return MISSING
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        expires_at = float("inf") if self.ttl is None else time.monotonic() + self.ttl
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key):
+        if self._data.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self.invalidations += len(self._data)
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data), "maxsize": self.maxsize, "ttl_seconds": self.ttl,
+            "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            "expirations": self.expirations, "invalidations": self.invalidations,
+        }
+
+
+# --- Snapshots: the cached, session-independent shape of a row ---
+
+@dataclass(frozen=True)
+class TermSnapshot:
+    id: int
+    code: str
+    term: str
+    system: str | None = None
+
+
+@dataclass(frozen=True)
+class MapSnapshot:
+    id: int
+    status: str
+    map_relationship: str
+    namaste_term: TermSnapshot
+    icd_term: TermSnapshot | None
+
+
+def snapshot_term(term) -> TermSnapshot | None:
+    if term is None:
+        return None
+    return TermSnapshot(id=term.id, code=term.code, term=term.term, system=getattr(term, "system", None))
+
+
+def snapshot_map(mapping) -> MapSnapshot | None:
+    if mapping is None:
+        return None
+    return MapSnapshot(
+        id=mapping.id, status=mapping.status, map_relationship=mapping.map_relationship,
+        namaste_term=snapshot_term(mapping.namaste_term), icd_term=snapshot_term(mapping.icd_term),
+    )
+
+
+# --- The application's caches ---
+
+# (namaste system, code) or ("namaste_id", id) -> MapSnapshot, or None for "no map"
+translations = LRUCache("translations", CACHE_SIZE, CACHE_TTL)
+# (system, code) or ("namaste_id", id) -> TermSnapshot, or None for "no such code"
+terms = LRUCache("terms", CACHE_SIZE, CACHE_TTL)
+
+ALL_CACHES = [translations, terms]
+
+# Which caches must be dropped when a table is reloaded by an ingestion script
+DEPENDENCIES = {
+    "namaste_terms": [translations, terms],
+    "icd_terms": [translations, terms],
+    "loinc_terms": [terms],
+    "concept_map": [translations],
+}
+
+# Called with the set of reloaded tables after the dependent caches are cleared
+RELOAD_HOOKS = []
+
+_watcher = VersionWatcher(REFRESH_INTERVAL)
+
+
+async def refresh(db):
+    """Clears the caches that depend on any table reloaded since the last check."""
+    changed = await _watcher.poll(db)
+    for table in changed:
+        for cache in DEPENDENCIES.get(table, ()):
+            cache.clear()
+    if changed:
+        for hook in RELOAD_HOOKS:
+            hook(changed)
+
+
+def invalidate_map(namaste_id: int, namaste_system: str, namaste_code: str):
+    """Drops every cached translation of one NAMASTE term after its map was curated."""
+    translations.invalidate((namaste_system, namaste_code))
+    translations.invalidate(("namaste_id", namaste_id))
+
+
+def stats() -> dict:
+    return {cache.name: cache.stats() for cache in ALL_CACHES}
@@ -1,103 +1,251 @@
-from sqlalchemy.orm import Session, joinedload
-from . import models
-
-# --- Terminology Search Functions (Unchanged) ---
-
-def search_namaste_terms(db: Session, query: str):
-    return db.query(models.NamasteTerm).filter(models.NamasteTerm.term.ilike(f"%{query}%")).all()
-
-def search_icd_terms(db: Session, query: str):
-    return db.query(models.IcdTerm).filter(models.IcdTerm.term.ilike(f"%{query}%")).all()
-
-def search_loinc_terms(db: Session, query: str):
-    return db.query(models.LoincTerm).filter(models.LoincTerm.term.ilike(f"%{query}%")).all()
-
-def search_snomed_terms(db: Session, query: str):
-    return db.query(models.SnomedTerm).filter(models.SnomedTerm.term.ilike(f"%{query}%")).all()
-
-# --- Mapping Functions (Unchanged) ---
-
-def get_mapping_for_namaste_code(db: Session, namaste_code: str, namaste_system: str):
-    namaste_term = db.query(models.NamasteTerm).filter(
-        models.NamasteTerm.code == namaste_code,
-        models.NamasteTerm.system == namaste_system
-    ).first()
-    if not namaste_term: return None
-    return db.query(models.ConceptMap).options(
-        joinedload(models.ConceptMap.namaste_term),
-        joinedload(models.ConceptMap.icd_term)
-    ).filter(models.ConceptMap.namaste_id == namaste_term.id).first()
-
-def get_reverse_map_for_icd_code(db: Session, icd_code: str):
-    mappings = db.query(models.ConceptMap).filter(models.ConceptMap.icd_code == icd_code).all()
-    namaste_ids = [mapping.namaste_id for mapping in mappings]
-    if not namaste_ids: return []
-    return db.query(models.NamasteTerm).filter(models.NamasteTerm.id.in_(namaste_ids)).all()
-
-def get_term_by_id(db: Session, term_id: int):
-    return db.query(models.NamasteTerm).filter(models.NamasteTerm.id == term_id).first()
-
-# --- UPGRADED Curation Functions ---
-
-def get_maps_by_status(db: Session, status: str, search: str | None = None, skip: int = 0, limit: int = 10):
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from . import models, search_index, cache, fhir_cache
+
+# All functions here are async and take an AsyncSession. The ingestion
+# scripts keep using the synchronous engine and don't go through this module.
+
+# --- Terminology Search Functions ---
+# Searches are served from the in-memory n-gram index rather than ILIKE scans.
+
+async def search_namaste_terms(db: AsyncSession, query: str, limit: int = 20, cursor: str | None = None):
+    return await search_index.search(db, "namaste", query, limit=limit, cursor=cursor)
+
+async def search_icd_terms(db: AsyncSession, query: str, limit: int = 20, cursor: str | None = None):
+    return await search_index.search(db, "icd11", query, limit=limit, cursor=cursor)
+
+async def search_loinc_terms(db: AsyncSession, query: str, limit: int = 20, cursor: str | None = None):
+    return await search_index.search(db, "loinc", query, limit=limit, cursor=cursor)
+
+async def search_snomed_terms(db: AsyncSession, query: str, limit: int = 20, cursor: str | None = None):
+    return await search_index.search(db, "snomed", query, limit=limit, cursor=cursor)
+
+# --- Mapping Functions ---
+# Translation and lookup results are served from app/cache.py when possible.
+# They are returned as snapshots that carry the same attributes as the ORM rows.
+
+async def get_mapping_for_namaste_code(db: AsyncSession, namaste_code: str, namaste_system: str):
+    await cache.refresh(db)
+    key = (namaste_system, namaste_code)
+    cached = cache.translations.get(key)
+    if cached is not cache.MISSING:
+        return cached
+
+    namaste_term = (await db.execute(
+        select(models.NamasteTerm).filter(
+            models.NamasteTerm.code == namaste_code,
+            models.NamasteTerm.system == namaste_system
+        ).order_by(models.NamasteTerm.id).limit(1)
+    )).scalars().first()
+    mapping = None
+    if namaste_term:
+        mapping = (await db.execute(
+            select(models.ConceptMap).options(
+                joinedload(models.ConceptMap.namaste_term),
+                joinedload(models.ConceptMap.icd_term)
+            ).filter(models.ConceptMap.namaste_id == namaste_term.id).order_by(models.ConceptMap.id).limit(1)
+        )).scalars().first()
+    snapshot = cache.snapshot_map(mapping)
+    cache.translations.set(key, snapshot)
+    return snapshot
+
+async def get_mappings_for_namaste_codes(db: AsyncSession, pairs):
     """
-    Retrieves a paginated list of concept maps, filtered by status and an optional search query.
+    Set-based get_mapping_for_namaste_code for batch $translate: resolves many
+    (namaste_system, code) pairs in one query. Returns {pair: MapSnapshot or
+    None}, picking the same term and map as the single lookup (lowest ids).
     """
-    query = (
-        db.query(models.ConceptMap)
+    mappings = dict.fromkeys(pairs)
+    if not mappings:
+        return mappings
+    rows = await db.execute(
+        select(models.NamasteTerm, models.ConceptMap, models.IcdTerm)
+        .outerjoin(models.ConceptMap, models.ConceptMap.namaste_id == models.NamasteTerm.id)
+        .outerjoin(models.IcdTerm, models.IcdTerm.code == models.ConceptMap.icd_code)
+        .filter(tuple_(models.NamasteTerm.system, models.NamasteTerm.code).in_(list(mappings)))
+        .order_by(models.NamasteTerm.id, models.ConceptMap.id)
+    )
+    resolved = set()
+    for term, mapping, icd_term in rows:
+        key = (term.system, term.code)
+        if key in resolved:
+            continue
+        resolved.add(key)
+        if mapping is not None:
+            mappings[key] = cache.MapSnapshot(
+                id=mapping.id, status=mapping.status, map_relationship=mapping.map_relationship,
+                namaste_term=cache.snapshot_term(term), icd_term=cache.snapshot_term(icd_term),
+            )
+    return mappings
+
+async def get_reverse_map_for_icd_code(db: AsyncSession, icd_code: str):
+    mappings = (await db.execute(
+        select(models.ConceptMap).filter(models.ConceptMap.icd_code == icd_code)
+    )).scalars().all()
+    namaste_ids = [mapping.namaste_id for mapping in mappings]
+    if not namaste_ids: return []
+    return (await db.execute(
+        select(models.NamasteTerm).filter(models.NamasteTerm.id.in_(namaste_ids))
+    )).scalars().all()
+
+async def get_term_by_id(db: AsyncSession, term_id: int):
+    await cache.refresh(db)
+    key = ("namaste_id", term_id)
+    cached = cache.terms.get(key)
+    if cached is not cache.MISSING:
+        return cached
+    term = (await db.execute(
+        select(models.NamasteTerm).filter(models.NamasteTerm.id == term_id)
+    )).scalars().first()
+    snapshot = cache.snapshot_term(term)
+    cache.terms.set(key, snapshot)
+    return snapshot
+
+async def get_map_for_term_id(db: AsyncSession, term_id: int):
+    """Finds the concept map (with its terms loaded) for a NAMASTE term id."""
+    await cache.refresh(db)
+    key = ("namaste_id", term_id)
+    cached = cache.translations.get(key)
+    if cached is not cache.MISSING:
+        return cached
+    mapping = (await db.execute(
+        select(models.ConceptMap)
         .options(
             joinedload(models.ConceptMap.namaste_term),
             joinedload(models.ConceptMap.icd_term)
         )
-        .filter(models.ConceptMap.status == status)
-    )
+        .filter(models.ConceptMap.namaste_id == term_id)
+        .order_by(models.ConceptMap.id)
+        .limit(1)
+    )).scalars().first()
+    snapshot = cache.snapshot_map(mapping)
+    cache.translations.set(key, snapshot)
+    return snapshot
 
+# --- UPGRADED Curation Functions ---
+
+def _maps_by_status_query(status: str, search: str | None):
+    query = select(models.ConceptMap).filter(models.ConceptMap.status == status)
     if search:
         query = query.join(models.NamasteTerm).filter(
             models.NamasteTerm.term.ilike(f"%{search}%")
         )
-    
-    return query.order_by(models.ConceptMap.id).offset(skip).limit(limit).all()
+    return query
 
-def get_maps_count_by_status(db: Session, status: str, search: str | None = None):
+async def get_maps_by_status(db: AsyncSession, status: str, search: str | None = None, skip: int = 0, limit: int = 10):
     """
-    Gets the total count of concept maps for a given status and optional search query.
+    Retrieves a paginated list of concept maps, filtered by status and an optional search query.
+    """
+    query = _maps_by_status_query(status, search).options(
+        joinedload(models.ConceptMap.namaste_term),
+        joinedload(models.ConceptMap.icd_term)
+    )
+    return (await db.execute(
+        query.order_by(models.ConceptMap.id).offset(skip).limit(limit)
+    )).scalars().all()
+
+async def get_maps_page_by_status(db: AsyncSession, status: str, search: str | None = None, after_id: int | None = None, limit: int = 10):
+    """
+    Keyset-paginated variant of get_maps_by_status. Returns the maps with
+    ids greater than `after_id` (at most `limit` + 1 of them, so the caller
+    can tell whether another page follows) together with the total count
+    for the filter. The count is a window over the filtered ids, so page and
+    total come from one statement.
     """
-    query = db.query(models.ConceptMap).filter(models.ConceptMap.status == status)
-    
+    filtered = (
+        select(models.ConceptMap.id.label("id"), func.count().over().label("total_count"))
+        .filter(models.ConceptMap.status == status)
+    )
     if search:
-        query = query.join(models.NamasteTerm).filter(
+        filtered = filtered.join(models.NamasteTerm).filter(
             models.NamasteTerm.term.ilike(f"%{search}%")
         )
-        
-    return query.count()
+    filtered = filtered.subquery()
 
+    query = (
+        select(models.ConceptMap, filtered.c.total_count)
+        .join(filtered, filtered.c.id == models.ConceptMap.id)
+        .options(
+            joinedload(models.ConceptMap.namaste_term),
+            joinedload(models.ConceptMap.icd_term)
+        )
+    )
+    if after_id is not None:
+        query = query.filter(filtered.c.id > after_id)
+    rows = (await db.execute(query.order_by(filtered.c.id).limit(limit + 1))).all()
+
+    if rows:
+        total_count = rows[0].total_count
+    elif after_id is None:
+        total_count = 0
+    else:
+        # Paged past the end: there is no row to carry the window count.
+        total_count = await get_maps_count_by_status(db, status=status, search=search)
+    return [row.ConceptMap for row in rows], total_count
+
+async def get_maps_count_by_status(db: AsyncSession, status: str, search: str | None = None):
+    """
+    Gets the total count of concept maps for a given status and optional search query.
+    """
+    query = _maps_by_status_query(status, search).with_only_columns(func.count(models.ConceptMap.id))
+    return (await db.execute(query)).scalar_one()
 
-def update_map(db: Session, map_id: int, relationship: str, status: str):
-    db_map = db.query(models.ConceptMap).filter(models.ConceptMap.id == map_id).first()
+
+def _invalidate_cached_map(db_map: models.ConceptMap):
+    term = db_map.namaste_term
+    cache.invalidate_map(db_map.namaste_id, term.system, term.code)
+    fhir_cache.invalidate_map(db_map.namaste_id, term.system, term.code)
+
+async def _get_map_with_terms(db: AsyncSession, map_id: int):
+    return (await db.execute(
+        select(models.ConceptMap).options(
+            joinedload(models.ConceptMap.namaste_term),
+            joinedload(models.ConceptMap.icd_term)
+        ).filter(models.ConceptMap.id == map_id)
+    )).scalars().first()
+
+async def update_map(db: AsyncSession, map_id: int, relationship: str, status: str):
+    # Terms are loaded up front: an async session can't lazy-load them later.
+    db_map = await _get_map_with_terms(db, map_id)
     if db_map:
         db_map.map_relationship = relationship
         db_map.status = status
-        db.commit()
-        db.refresh(db_map)
+        await db.commit()
+        _invalidate_cached_map(db_map)
     return db_map
 
-def delete_map(db: Session, map_id: int):
-    db_map = db.query(models.ConceptMap).filter(models.ConceptMap.id == map_id).first()
+async def delete_map(db: AsyncSession, map_id: int):
+    db_map = await _get_map_with_terms(db, map_id)
     if db_map:
-        db.delete(db_map)
-        db.commit()
+        await db.delete(db_map)
+        await db.commit()
+        _invalidate_cached_map(db_map)
     return db_map
 
-def get_term_by_system_and_code(db: Session, system: str, code: str):
+async def get_term_by_system_and_code(db: AsyncSession, system: str, code: str):
     """
     Finds a single term in the database by its system and code.
     """
+    await cache.refresh(db)
+    key = (system, code)
+    cached = cache.terms.get(key)
+    if cached is not cache.MISSING:
+        return cached
+
     if system.startswith("namaste"):
         system_name = system.split('_')[-1]
-        return db.query(models.NamasteTerm).filter_by(system=system_name, code=code).first()
+        model = models.NamasteTerm
+        query = select(model).filter_by(system=system_name, code=code)
     elif system == "icd11":
-        return db.query(models.IcdTerm).filter_by(code=code).first()
+        model = models.IcdTerm
+        query = select(model).filter_by(code=code)
     elif system == "loinc":
-        return db.query(models.LoincTerm).filter_by(code=code).first()
-    return None
\ No newline at end of file
+        model = models.LoincTerm
+        query = select(model).filter_by(code=code)
+    else:
+        return None
+    row = (await db.execute(query.order_by(model.id).limit(1))).scalars().first()
+    snapshot = cache.snapshot_term(row)
+    cache.terms.set(key, snapshot)
+    return snapshot
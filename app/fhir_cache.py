@@ -0,0 +1,149 @@
+"""
+Pre-serialized FHIR responses for $lookup, $translate and /fhir/condition.
+
+The FHIR body for a given code only changes when its map is curated or a
+table is reloaded, so each one is built with fhir.resources once, stored as
+JSON bytes and sent as-is afterwards. The cache is warmed in the background
+at startup and after every ingest; curation drops just the entries of the
+term it touched, which are rebuilt on their next request.
+"""
+import asyncio
+import os
+
+import orjson
+from fastapi.responses import Response
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+
+from . import cache, fhir_converter, fhir_utils, models
+from .database import AsyncSessionLocal
+
+FHIR_CACHE_SIZE = int(os.getenv("FHIR_CACHE_SIZE", "200000"))
+# Code systems whose $lookup bodies are built ahead of time. LOINC is large
+# enough that by default its bodies are only cached once requested.
+WARM_SYSTEMS = [s.strip() for s in os.getenv("FHIR_CACHE_WARM_SYSTEMS", "namaste,icd11").split(",") if s.strip()]
+
+# ("lookup", system, code), ("translate", system, code) or
+# ("condition", "namaste_id", id) -> JSON bytes
+responses = cache.LRUCache("fhir_responses", FHIR_CACHE_SIZE, ttl=None)
+cache.ALL_CACHES.append(responses)
+for dependents in cache.DEPENDENCIES.values():
+    dependents.append(responses)
+
+_warm_task: asyncio.Task | None = None
+# Keys invalidated while a warm-up is running; the warm-up must not restore them.
+_invalidated_during_warm: set | None = None
+
+
+def serialize(resource) -> bytes:
+    return orjson.dumps(resource.dict(exclude_none=True))
+
+
+def json_response(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+
+async def get(db, key):
+    """Returns the cached body for `key`, or cache.MISSING."""
+    await cache.refresh(db)
+    return responses.get(key)
+
+
+def store(key, resource) -> bytes:
+    body = serialize(resource)
+    responses.set(key, body)
+    return body
+
+
+def invalidate_map(namaste_id: int, namaste_system: str, namaste_code: str):
+    """Drops the bodies that embed one NAMASTE term's map."""
+    keys = [("translate", f"namaste_{namaste_system}", namaste_code), ("condition", "namaste_id", namaste_id)]
+    for key in keys:
+        responses.invalidate(key)
+    if _invalidated_during_warm is not None:
+        _invalidated_during_warm.update(keys)
+
+
+# --- Warming ---
+
+def _first_by(rows, key):
+    """Keeps the first row per key, matching the crud lookups' lowest-id choice."""
+    chosen = {}
+    for row in rows:
+        chosen.setdefault(key(row), row)
+    return chosen
+
+
+def _build_all(namaste_terms, maps_by_term, other_terms) -> dict:
+    bodies = {}
+    for term in namaste_terms:
+        db_map = maps_by_term.get(term.id)
+        bodies[("condition", "namaste_id", term.id)] = serialize(fhir_converter.create_fhir_condition(term, db_map))
+
+    for (system_name, code), term in _first_by(namaste_terms, lambda t: (t.system, t.code)).items():
+        system = f"namaste_{system_name}"
+        if "namaste" in WARM_SYSTEMS:
+            bodies[("lookup", system, code)] = serialize(
+                fhir_utils.create_lookup_parameters(term, fhir_utils.SYSTEM_URIS.get(system, ""), system))
+        db_map = maps_by_term.get(term.id)
+        if db_map and db_map.icd_term:
+            bodies[("translate", system, code)] = serialize(
+                fhir_utils.create_translate_conceptmap(term, db_map.icd_term, db_map.map_relationship))
+
+    for system, terms in other_terms.items():
+        for term in terms:
+            bodies[("lookup", system, term.code)] = serialize(
+                fhir_utils.create_lookup_parameters(term, fhir_utils.SYSTEM_URIS[system], system))
+    return bodies
+
+
+async def warm():
+    """
+    Reads the terminology and map tables in a few bulk queries and builds
+    every cacheable body. Serialization runs on a worker thread.
+    """
+    global _invalidated_during_warm
+    _invalidated_during_warm = set()
+    try:
+        async with AsyncSessionLocal() as db:
+            await cache.refresh(db)
+            namaste_terms = [cache.snapshot_term(t) for t in (await db.execute(
+                select(models.NamasteTerm).order_by(models.NamasteTerm.id))).scalars()]
+            maps = (await db.execute(
+                select(models.ConceptMap)
+                .options(joinedload(models.ConceptMap.namaste_term), joinedload(models.ConceptMap.icd_term))
+                .order_by(models.ConceptMap.id)
+            )).scalars()
+            maps_by_term = {
+                namaste_id: cache.snapshot_map(db_map)
+                for namaste_id, db_map in _first_by(maps, lambda m: m.namaste_id).items()
+            }
+            other_terms = {}
+            for system, model in (("icd11", models.IcdTerm), ("loinc", models.LoincTerm)):
+                if system in WARM_SYSTEMS:
+                    other_terms[system] = [cache.snapshot_term(t) for t in (await db.execute(
+                        select(model).order_by(model.id))).scalars()]
+
+        bodies = await asyncio.to_thread(_build_all, namaste_terms, maps_by_term, other_terms)
+        for key, body in bodies.items():
+            if key not in _invalidated_during_warm:
+                responses.set(key, body)
+    finally:
+        _invalidated_during_warm = None
+    print(f"FHIR response cache warmed with {len(bodies)} entries.")
+
+
+def _report_warm_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"FHIR response cache warm-up failed: {task.exception()}")
+
+
+def schedule_warm(changed_tables=None):
+    """Starts a background warm-up unless one is already running."""
+    global _warm_task
+    if _warm_task is None or _warm_task.done():
+        _warm_task = asyncio.get_running_loop().create_task(warm())
+        _warm_task.add_done_callback(_report_warm_failure)
+
+
+cache.RELOAD_HOOKS.append(schedule_warm)
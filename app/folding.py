@@ -0,0 +1,42 @@
+"""
+Text folding shared by ingestion (to precompute search keys) and the search
+index (to fold queries the same way).
+"""
+import re
+import unicodedata
+
+# Separates the individual keys stored in NamasteTerm.search_keys.
+KEY_SEPARATOR = "|"
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fold(text) -> str:
+    """
+    Lower-cases, collapses whitespace and strips diacritics from Latin letters,
+    so 'vyādhi-viniścayaḥ' folds to 'vyadhi-viniscayah'. Marks on other scripts
+    (Devanagari matras, Tamil vowel signs) are part of the letter and are kept.
+    """
+    if not isinstance(text, str):
+        return ""
+    chars = []
+    base = ""
+    for ch in unicodedata.normalize("NFKD", text):
+        if unicodedata.combining(ch):
+            if base <= "\u024f":  # end of the Latin Extended blocks
+                continue
+        else:
+            base = ch
+        chars.append(ch)
+    folded = unicodedata.normalize("NFC", "".join(chars))
+    return _WHITESPACE.sub(" ", folded).strip().lower()
+
+
+def build_search_keys(*variants) -> str:
+    """Folds every spelling of a term and joins the distinct results into one column value."""
+    keys = dict.fromkeys(key for key in map(fold, variants) if key and key != "nan")
+    return KEY_SEPARATOR.join(keys)
+
+
+def split_search_keys(value) -> list[str]:
+    return [key for key in value.split(KEY_SEPARATOR) if key] if isinstance(value, str) else []
@@ -1,17 +1,36 @@
-from fastapi import FastAPI, Depends, HTTPException, Security
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, Security, Request, Response, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security.api_key import APIKeyHeader
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Dict, Any
 from datetime import datetime
-from sqlalchemy.orm import joinedload
 
-from . import crud, models, schemas, fhir_converter, fhir_utils
-from .database import SessionLocal, engine
+from . import crud, models, schemas, fhir_converter, fhir_utils, search_index, unified_search, cache, fhir_cache, batch_translate
+from .database import AsyncSessionLocal, engine, sync_schema
+from .pagination import InvalidCursor, encode_cursor, decode_cursor
 
-models.Base.metadata.create_all(bind=engine)
+sync_schema(engine)
 
-app = FastAPI(title="AyushBridge")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the search indexes before the first request arrives.
+    async with AsyncSessionLocal() as db:
+        await search_index.warm(db)
+    # FHIR bodies are built in the background; requests fall back to building them until then.
+    fhir_cache.schedule_warm()
+    yield
+
+app = FastAPI(title="AyushBridge", lifespan=lifespan)
+
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+@app.exception_handler(batch_translate.InvalidBatch)
+async def invalid_batch_handler(request: Request, exc: batch_translate.InvalidBatch):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
 
 # --- Security Setup ---
 API_KEY_NAME = "X-API-Key"
@@ -27,44 +46,83 @@ async def get_api_key(key: str = Security(api_key_header)):
         )
 
 # --- Database Dependency ---
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 # --- API Routes ---
 @app.get("/health")
-def health_check():
+async def health_check():
     return {"status": "ok"}
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit, miss and eviction counters for the translation and lookup caches."""
+    return cache.stats()
+
 # --- Terminology Search Endpoints ---
+# Results are relevance-ranked and paginated. When more results exist, the
+# cursor for the next page is returned in the X-Next-Cursor header.
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+
+def _set_next_cursor(response: Response, next_cursor: str | None):
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+@app.get("/search", response_model=schemas.UnifiedSearchResponse)
+async def search_all_terminologies(
+    term: str,
+    systems: str | None = None,
+    per_system: int = Query(10, ge=1, le=50),
+    budget_ms: int = Query(unified_search.SEARCH_BUDGET_MS, ge=1, le=unified_search.SEARCH_BUDGET_MS),
+):
+    """
+    Searches NAMASTE, ICD-11, LOINC and SNOMED CT concurrently and returns one
+    ranked list. 'systems' is an optional comma-separated subset. Sources that
+    do not answer within 'budget_ms' are listed in 'timed_out'.
+    """
+    sources = list(unified_search.SEARCHERS)
+    if systems:
+        sources = list(dict.fromkeys(s.strip() for s in systems.split(",") if s.strip()))
+        unknown = [s for s in sources if s not in unified_search.SEARCHERS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown system(s): {', '.join(unknown)}")
+    return await unified_search.search_all(term, sources, per_source=per_system, budget_ms=budget_ms)
+
 @app.get("/search/namaste", response_model=List[schemas.NamasteTerm])
-def search_for_namaste_terms(term: str, db: Session = Depends(get_db)):
+async def search_for_namaste_terms(response: Response, term: str, limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT), cursor: str | None = None, db: AsyncSession = Depends(get_db)):
     """Search for NAMASTE terms across Ayurveda, Siddha, and Unani systems."""
-    return crud.search_namaste_terms(db=db, query=term)
+    results, next_cursor = await crud.search_namaste_terms(db=db, query=term, limit=limit, cursor=cursor)
+    _set_next_cursor(response, next_cursor)
+    return results
 
 @app.get("/search/icd11", response_model=List[schemas.IcdTerm])
-def search_for_icd_terms(term: str, db: Session = Depends(get_db)):
+async def search_for_icd_terms(response: Response, term: str, limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT), cursor: str | None = None, db: AsyncSession = Depends(get_db)):
     """Search for ICD-11 terms."""
-    return crud.search_icd_terms(db=db, query=term)
+    results, next_cursor = await crud.search_icd_terms(db=db, query=term, limit=limit, cursor=cursor)
+    _set_next_cursor(response, next_cursor)
+    return results
 
 @app.get("/search/loinc", response_model=List[schemas.LoincTerm])
-def search_for_loinc_terms(term: str, db: Session = Depends(get_db)):
+async def search_for_loinc_terms(response: Response, term: str, limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT), cursor: str | None = None, db: AsyncSession = Depends(get_db)):
     """Search for LOINC terms."""
-    return crud.search_loinc_terms(db=db, query=term)
+    results, next_cursor = await crud.search_loinc_terms(db=db, query=term, limit=limit, cursor=cursor)
+    _set_next_cursor(response, next_cursor)
+    return results
     
 @app.get("/search/snomed", response_model=List[schemas.SnomedTerm])
-def search_for_snomed_terms(term: str, db: Session = Depends(get_db)):
+async def search_for_snomed_terms(response: Response, term: str, limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT), cursor: str | None = None, db: AsyncSession = Depends(get_db)):
     """Search for SNOMED CT terms."""
-    return crud.search_snomed_terms(db=db, query=term)
+    results, next_cursor = await crud.search_snomed_terms(db=db, query=term, limit=limit, cursor=cursor)
+    _set_next_cursor(response, next_cursor)
+    return results
 
 # --- Mapping Endpoints ---
 @app.get("/map", response_model=schemas.ConceptMapResponse)
-def get_mapping(namaste_code: str, namaste_system: str, db: Session = Depends(get_db)):
+async def get_mapping(namaste_code: str, namaste_system: str, db: AsyncSession = Depends(get_db)):
     """Retrieves the ICD-11 mapping for a specific NAMASTE code and system."""
-    mapping = crud.get_mapping_for_namaste_code(db=db, namaste_code=namaste_code, namaste_system=namaste_system)
+    mapping = await crud.get_mapping_for_namaste_code(db=db, namaste_code=namaste_code, namaste_system=namaste_system)
     if mapping is None:
         raise HTTPException(status_code=404, detail=f"No mapping found for NAMASTE code '{namaste_code}' in system '{namaste_system}'")
     response_data = {
@@ -75,37 +133,51 @@ def get_mapping(namaste_code: str, namaste_system: str, db: Session = Depends(ge
     return response_data
 
 @app.get("/map/reverse", response_model=List[schemas.NamasteTerm])
-def get_reverse_mapping(icd_code: str, db: Session = Depends(get_db)):
+async def get_reverse_mapping(icd_code: str, db: AsyncSession = Depends(get_db)):
     """Performs a reverse lookup, finding all NAMASTE terms mapped to a given ICD-11 code."""
-    namaste_terms = crud.get_reverse_map_for_icd_code(db=db, icd_code=icd_code)
+    namaste_terms = await crud.get_reverse_map_for_icd_code(db=db, icd_code=icd_code)
     if not namaste_terms:
         raise HTTPException(status_code=404, detail=f"No NAMASTE terms found mapped to ICD-11 code: {icd_code}")
     return namaste_terms
 
 # --- Curation Endpoints ---
 @app.get("/maps/count")
-def get_maps_count_endpoint(status: str = 'reviewed', search: str | None = None, db: Session = Depends(get_db)):
+async def get_maps_count_endpoint(status: str = 'reviewed', search: str | None = None, db: AsyncSession = Depends(get_db)):
     """Get the total count of maps for a given status and optional search."""
-    count = crud.get_maps_count_by_status(db, status=status, search=search)
+    count = await crud.get_maps_count_by_status(db, status=status, search=search)
     return {"status": status, "search": search, "total_count": count}
 
+def _map_response(mapping: models.ConceptMap) -> dict:
+    return {
+        "id": mapping.id, "status": mapping.status,
+        "map_relationship": mapping.map_relationship,
+        "source_term": mapping.namaste_term, "target_term": mapping.icd_term
+    }
+
 @app.get("/maps/by_status", response_model=List[schemas.ConceptMapResponse])
-def get_maps_by_status_endpoint(status: str = 'reviewed', search: str | None = None, skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+async def get_maps_by_status_endpoint(status: str = 'reviewed', search: str | None = None, skip: int = 0, limit: int = 10, db: AsyncSession = Depends(get_db)):
     """Get a paginated list of maps filtered by status and an optional search query."""
-    maps_from_db = crud.get_maps_by_status(db, status=status, search=search, skip=skip, limit=limit)
-    response = []
-    for mapping in maps_from_db:
-        response.append({
-            "id": mapping.id, "status": mapping.status,
-            "map_relationship": mapping.map_relationship,
-            "source_term": mapping.namaste_term, "target_term": mapping.icd_term
-        })
-    return response
+    maps_from_db = await crud.get_maps_by_status(db, status=status, search=search, skip=skip, limit=limit)
+    return [_map_response(mapping) for mapping in maps_from_db]
+
+@app.get("/maps/page", response_model=schemas.ConceptMapPage)
+async def get_maps_page_endpoint(status: str = 'reviewed', search: str | None = None, cursor: str | None = None, limit: int = Query(10, ge=1, le=100), db: AsyncSession = Depends(get_db)):
+    """
+    Keyset-paginated maps for a status and optional search, returned together
+    with the total count so one request serves a whole curation page.
+    """
+    after_id = decode_cursor(cursor).get("after") if cursor else None
+    if after_id is not None and not isinstance(after_id, int):
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+    maps_from_db, total_count = await crud.get_maps_page_by_status(db, status=status, search=search, after_id=after_id, limit=limit)
+    page = maps_from_db[:limit]
+    next_cursor = encode_cursor({"after": page[-1].id}) if len(maps_from_db) > limit else None
+    return {"items": [_map_response(mapping) for mapping in page], "total_count": total_count, "next_cursor": next_cursor}
 
 @app.put("/maps/{map_id}", response_model=schemas.ConceptMapResponse)
-def update_map_endpoint(map_id: int, map_update: schemas.MapUpdate, db: Session = Depends(get_db)):
+async def update_map_endpoint(map_id: int, map_update: schemas.MapUpdate, db: AsyncSession = Depends(get_db)):
     """Approve or update a concept map."""
-    updated_map = crud.update_map(db, map_id=map_id, relationship=map_update.map_relationship, status=map_update.status)
+    updated_map = await crud.update_map(db, map_id=map_id, relationship=map_update.map_relationship, status=map_update.status)
     if updated_map is None:
         raise HTTPException(status_code=404, detail="Map not found")
     response_data = {
@@ -116,29 +188,32 @@ def update_map_endpoint(map_id: int, map_update: schemas.MapUpdate, db: Session
     return response_data
 
 @app.delete("/maps/{map_id}")
-def delete_map_endpoint(map_id: int, db: Session = Depends(get_db)):
+async def delete_map_endpoint(map_id: int, db: AsyncSession = Depends(get_db)):
     """Reject (delete) an incorrect concept map."""
-    deleted_map = crud.delete_map(db, map_id=map_id)
+    deleted_map = await crud.delete_map(db, map_id=map_id)
     if deleted_map is None:
         raise HTTPException(status_code=404, detail="Map not found")
     return {"status": "success", "message": "Map deleted"}
 
 # --- FHIR Terminology Service Endpoints ---
 @app.get("/fhir/CodeSystem/$lookup")
-def fhir_lookup(system: str, code: str, db: Session = Depends(get_db)):
+async def fhir_lookup(system: str, code: str, db: AsyncSession = Depends(get_db)):
     """FHIR $lookup operation. Provides details for a specified code in a specified system."""
     system_uri = fhir_utils.SYSTEM_URIS.get(system)
     if not system_uri:
         raise HTTPException(status_code=400, detail=f"Unknown system: {system}")
-    term_object = crud.get_term_by_system_and_code(db, system=system, code=code)
-    if not term_object:
-        raise HTTPException(status_code=404, detail=f"Code '{code}' not found in system '{system}'")
-    fhir_parameters = fhir_utils.create_lookup_parameters(term_object, system_uri, system)
-    return fhir_parameters.dict(exclude_none=True)
+    key = ("lookup", system, code)
+    body = await fhir_cache.get(db, key)
+    if body is cache.MISSING:
+        term_object = await crud.get_term_by_system_and_code(db, system=system, code=code)
+        if not term_object:
+            raise HTTPException(status_code=404, detail=f"Code '{code}' not found in system '{system}'")
+        body = fhir_cache.store(key, fhir_utils.create_lookup_parameters(term_object, system_uri, system))
+    return fhir_cache.json_response(body)
 
 # --- THE FIX: A simpler and more robust $translate endpoint ---
 @app.get("/fhir/ConceptMap/$translate")
-def fhir_translate(code: str, system: str, db: Session = Depends(get_db)):
+async def fhir_translate(code: str, system: str, db: AsyncSession = Depends(get_db)):
     """
     FHIR $translate operation.
     Translates a NAMASTE code to its ICD-11 equivalent.
@@ -151,8 +226,13 @@ def fhir_translate(code: str, system: str, db: Session = Depends(get_db)):
             detail=f"Translation only supported from a valid NAMASTE system. Use one of: {', '.join(valid_systems)}"
         )
 
+    key = ("translate", system, code)
+    body = await fhir_cache.get(db, key)
+    if body is not cache.MISSING:
+        return fhir_cache.json_response(body)
+
     system_name = system.split('_')[-1] # Extracts 'ayurveda', 'siddha', or 'unani'
-    mapping = crud.get_mapping_for_namaste_code(db, namaste_code=code, namaste_system=system_name)
+    mapping = await crud.get_mapping_for_namaste_code(db, namaste_code=code, namaste_system=system_name)
 
     if not mapping or not mapping.icd_term:
         raise HTTPException(status_code=404, detail=f"No translation found for code '{code}' in system '{system}'")
@@ -162,36 +242,55 @@ def fhir_translate(code: str, system: str, db: Session = Depends(get_db)):
         mapping.icd_term,
         mapping.map_relationship
     )
-    return fhir_concept_map.dict(exclude_none=True)
+    return fhir_cache.json_response(fhir_cache.store(key, fhir_concept_map))
+
+@app.post("/fhir/ConceptMap/$translate")
+async def fhir_translate_batch(request: Request):
+    """
+    Batch $translate. Takes a FHIR Parameters resource with one 'coding'
+    parameter (valueCoding with system and code) per code to translate, or
+    NDJSON with one {"system", "code"} object per line when sent as
+    application/x-ndjson. Streams back one $translate result Parameters per
+    coding, as NDJSON in input order.
+    """
+    if "ndjson" in request.headers.get("content-type", ""):
+        codings = batch_translate.codings_from_ndjson(request.stream())
+    else:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body is not valid JSON")
+        codings = batch_translate.codings_from_parameters(body)
+    return StreamingResponse(batch_translate.translate_stream(codings), media_type="application/x-ndjson")
 
 @app.get("/fhir/condition/{term_id}")
-def generate_fhir_condition(term_id: int, db: Session = Depends(get_db)):
+async def generate_fhir_condition(term_id: int, db: AsyncSession = Depends(get_db)):
     """
     Finds a NAMASTE term and its corresponding map, then generates a
     doubly-coded FHIR Condition resource.
     """
+    key = ("condition", "namaste_id", term_id)
+    body = await fhir_cache.get(db, key)
+    if body is not cache.MISSING:
+        return fhir_cache.json_response(body)
+
     # Find the NAMASTE term by its primary ID
-    db_term = crud.get_term_by_id(db=db, term_id=term_id)
+    db_term = await crud.get_term_by_id(db=db, term_id=term_id)
     if db_term is None:
         raise HTTPException(status_code=404, detail="Term not found")
 
     # Now, efficiently find the map associated with this term's ID
-    db_map = (
-        db.query(models.ConceptMap)
-        .options(joinedload(models.ConceptMap.icd_term))
-        .filter(models.ConceptMap.namaste_id == term_id)
-        .first()
-    )
+    db_map = await crud.get_map_for_term_id(db, term_id=term_id)
 
     # Pass BOTH the term and its map (which can be None) to the converter
     fhir_resource = fhir_converter.create_fhir_condition(db_term, db_map)
     
-    # Return the dictionary version of the FHIR resource
-    return fhir_resource.dict(exclude_none=True)
+    # Store and return the serialized FHIR resource
+    return fhir_cache.json_response(fhir_cache.store(key, fhir_resource))
 
 # --- Secure Bundle Upload (Unchanged) ---
 @app.post("/bundle")
-def upload_encounter_bundle(bundle: Dict[str, Any], api_key: str = Depends(get_api_key)):
+async def upload_encounter_bundle(bundle: Dict[str, Any], api_key: str = Depends(get_api_key)):
     print(f"--- AUDIT LOG ---")
     print(f"Timestamp: {datetime.utcnow().isoformat()}")
     print(f"Authenticated Principal: User with token ending in ...{api_key[-4:]}")
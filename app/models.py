@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, PrimaryKeyConstraint, ForeignKeyConstraint
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, PrimaryKeyConstraint, ForeignKeyConstraint
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -17,6 +18,9 @@ class NamasteTerm(Base):
     code = Column(String, index=True) # Index for fast lookups
     term = Column(String)
     system = Column(String, index=True) # Index for fast lookups
+    # Folded spellings (ASCII IAST, Harvard-Kyoto, native script) joined by '|',
+    # computed at ingestion and indexed by app/search_index.py
+    search_keys = Column(String, nullable=True)
 
 
 class SnomedTerm(Base):
@@ -51,4 +55,17 @@ class ConceptMap(Base):
     namaste_term = relationship("NamasteTerm")
     icd_term = relationship("IcdTerm")
     snomed_term = relationship("SnomedTerm")
-    loinc_term = relationship("LoincTerm")
\ No newline at end of file
+    loinc_term = relationship("LoincTerm")
+
+
+class TableVersion(Base):
+    """
+    A counter per terminology table, bumped by the ingestion scripts whenever
+    they reload that table. The API compares these to decide when its
+    in-memory structures (e.g. the search index) are stale.
+    """
+    __tablename__ = "table_versions"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -29,6 +29,21 @@ class SnomedTerm(BaseModel):
     code: str
     term: str
 
+class SearchHit(BaseModel):
+    source: str # 'namaste', 'icd11', 'loinc' or 'snomed'
+    id: int | None = None
+    code: str
+    term: str
+    system: str | None = None # NAMASTE sub-system (ayurveda, siddha, unani)
+    score: float
+
+class UnifiedSearchResponse(BaseModel):
+    query: str
+    results: list[SearchHit]
+    partial: bool # True when a source timed out or failed
+    timed_out: list[str]
+    failed: list[str]
+
 class ConceptMapResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     
@@ -38,6 +53,11 @@ class ConceptMapResponse(BaseModel):
     source_term: NamasteTerm
     target_term: IcdTerm | None = None
 
+class ConceptMapPage(BaseModel):
+    items: list[ConceptMapResponse]
+    total_count: int
+    next_cursor: str | None = None # Pass back as 'cursor' to get the next page
+
 # Add this new schema to app/schemas.py
 class MapUpdate(BaseModel):
     map_relationship: str
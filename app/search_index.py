@@ -0,0 +1,220 @@
+"""
+In-memory n-gram search over the terminology tables.
+
+Each table is loaded once into inverted indexes of term prefixes, word
+prefixes and character trigrams, so a search never touches the database and
+stops as soon as it has filled the requested page. The indexes are rebuilt
+when an ingestion script bumps the table's version (see app/table_versions.py).
+"""
+import asyncio
+import os
+import time
+from array import array
+from collections import defaultdict
+
+from sqlalchemy import select
+
+from . import models
+from .folding import fold, split_search_keys
+from .pagination import encode_cursor, decode_cursor, InvalidCursor
+from .table_versions import get_table_versions
+
+# How often (seconds) a search may check whether the tables were reloaded.
+REFRESH_INTERVAL = float(os.getenv("SEARCH_INDEX_REFRESH_SECONDS", "10"))
+
+# index name -> (model, columns kept in memory and returned to the client,
+#                column holding precomputed search keys or None)
+INDEX_SPECS = {
+    "namaste": (models.NamasteTerm, ("id", "code", "term", "system"), "search_keys"),
+    "icd11": (models.IcdTerm, ("id", "code", "term"), None),
+    "loinc": (models.LoincTerm, ("id", "code", "term"), None),
+    "snomed": (models.SnomedTerm, ("id", "code", "term"), None),
+}
+
+# Word and term prefixes are indexed up to this many characters; longer
+# queries use the prefix lists as candidates and verify the rest.
+PREFIX_LEN = 5
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _word_prefixes(text: str) -> set[str]:
+    return {word[:i] for word in text.split(" ") for i in range(1, min(len(word), PREFIX_LEN) + 1)}
+
+
+class NgramIndex:
+    """
+    A trigram inverted index over a list of term documents.
+
+    A document may be indexed under several keys (e.g. a diacritical term and
+    its ASCII and Devanagari spellings). Keys are stored shortest first, so
+    every posting list is already in ranking order within a relevance tier
+    and a search can stop as soon as it has filled the requested page.
+    """
+
+    def __init__(self, docs: list[dict], keys: list[list[str]]):
+        self.docs = docs
+        entries = sorted(
+            ((doc_id, key) for doc_id, doc_keys in enumerate(keys) for key in doc_keys),
+            key=lambda entry: len(entry[1]),
+        )
+        self._owners = array("i", (doc_id for doc_id, _ in entries))
+        self._texts = [key for _, key in entries]
+
+        exact, trigrams, term_prefixes, word_prefixes = (defaultdict(list) for _ in range(4))
+        for entry_id, text in enumerate(self._texts):
+            exact[text].append(entry_id)
+            for gram in _trigrams(text):
+                trigrams[gram].append(entry_id)
+            for i in range(1, min(len(text), PREFIX_LEN) + 1):
+                term_prefixes[text[:i]].append(entry_id)
+            for prefix in _word_prefixes(text):
+                word_prefixes[prefix].append(entry_id)
+        self._exact = dict(exact)
+        self._trigrams = {gram: array("i", ids) for gram, ids in trigrams.items()}
+        self._term_prefixes = {prefix: array("i", ids) for prefix, ids in term_prefixes.items()}
+        self._word_prefixes = {prefix: array("i", ids) for prefix, ids in word_prefixes.items()}
+
+    def __len__(self):
+        return len(self.docs)
+
+    def _substring_candidates(self, query: str):
+        """The shortest posting list among the query's trigrams."""
+        lists = []
+        for gram in _trigrams(query):
+            posting = self._trigrams.get(gram)
+            if posting is None:
+                return ()
+            lists.append(posting)
+        return min(lists, key=len)
+
+    @staticmethod
+    def _score(query: str, text: str) -> float:
+        """
+        Exact matches beat term-prefix matches, which beat word-prefix matches,
+        which beat plain substring matches; within a tier shorter terms win.
+        """
+        if text == query:
+            tier = 3
+        elif text.startswith(query):
+            tier = 2
+        elif f" {query}" in text:
+            tier = 1
+        else:
+            tier = 0
+        return tier + len(query) / len(text)
+
+    def search(self, query: str, limit: int, offset: int = 0) -> tuple[list[dict], bool]:
+        """
+        Returns one ranked page of matching documents and whether more follow.
+        Each document is returned with its relevance score under 'score'.
+        Queries shorter than three characters only match word prefixes.
+        """
+        query = fold(query)
+        if not query:
+            return [], False
+        needed = offset + limit + 1
+        ranked, seen = [], set()
+
+        def take(candidates, matches):
+            for entry_id in candidates:
+                if len(ranked) >= needed:
+                    return
+                doc_id = self._owners[entry_id]
+                if doc_id not in seen and matches(self._texts[entry_id]):
+                    seen.add(doc_id)
+                    ranked.append((doc_id, self._texts[entry_id]))
+
+        prefix = query[:PREFIX_LEN]
+        word_start = f" {query}"
+        take(self._exact.get(query, ()), lambda text: True)
+        take(self._term_prefixes.get(prefix, ()), lambda text: text.startswith(query))
+        take(self._word_prefixes.get(prefix, ()), lambda text: text.startswith(query) or word_start in text)
+        if len(query) >= 3:
+            take(self._substring_candidates(query), lambda text: query in text)
+
+        page = [
+            {**self.docs[doc_id], "score": self._score(query, text)}
+            for doc_id, text in ranked[offset:offset + limit]
+        ]
+        return page, len(ranked) > offset + limit
+
+
+class _IndexSlot:
+    def __init__(self):
+        self.index: NgramIndex | None = None
+        self.version: int | None = None
+        self.checked_at = 0.0
+        self.lock = asyncio.Lock()
+
+
+_slots = {name: _IndexSlot() for name in INDEX_SPECS}
+
+
+async def build_index(db, name: str) -> NgramIndex:
+    """
+    Reads a terminology table in one query and indexes it, using the stored
+    search keys where the table has them and folding the term otherwise.
+    Indexing runs on a worker thread so the event loop keeps serving.
+    """
+    model, columns, keys_column = INDEX_SPECS[name]
+    selected = [getattr(model, c) for c in columns]
+    if keys_column:
+        selected.append(getattr(model, keys_column))
+    rows = (await db.execute(select(*selected).order_by(model.id))).all()
+
+    docs, keys = [], []
+    for row in rows:
+        doc = row._asdict()
+        stored = split_search_keys(doc.pop(keys_column)) if keys_column else []
+        docs.append(doc)
+        keys.append(stored or [fold(doc["term"])])
+    return await asyncio.to_thread(NgramIndex, docs, keys)
+
+
+async def get_index(db, name: str) -> NgramIndex:
+    """
+    Returns the index for `name`, building it on first use and rebuilding it
+    when the table's version has moved on. Searches arriving during a rebuild
+    keep using the previous index.
+    """
+    slot = _slots[name]
+    table_name = INDEX_SPECS[name][0].__tablename__
+    now = time.monotonic()
+    if slot.index is not None and now - slot.checked_at < REFRESH_INTERVAL:
+        return slot.index
+
+    version = (await get_table_versions(db)).get(table_name, 0)
+    if slot.index is not None and slot.version == version:
+        slot.checked_at = now
+        return slot.index
+
+    if slot.index is not None and slot.lock.locked():
+        return slot.index
+    async with slot.lock:
+        if slot.index is None or slot.version != version:
+            slot.index = await build_index(db, name)
+            slot.version = version
+        slot.checked_at = time.monotonic()
+        return slot.index
+
+
+async def warm(db):
+    """Builds every index up front so the first keystroke doesn't pay for it."""
+    for name in INDEX_SPECS:
+        await get_index(db, name)
+
+
+async def search(db, name: str, query: str, limit: int, cursor: str | None = None) -> tuple[list[dict], str | None]:
+    """
+    Searches one terminology. Returns the page of results and the cursor for
+    the next page (None on the last page).
+    """
+    offset = decode_cursor(cursor).get("offset", 0) if cursor else 0
+    if not isinstance(offset, int) or offset < 0:
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+    results, has_more = (await get_index(db, name)).search(query, limit=limit, offset=offset)
+    next_cursor = encode_cursor({"offset": offset + limit}) if has_more else None
+    return results, next_cursor
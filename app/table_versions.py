@@ -0,0 +1,54 @@
+import time
+from datetime import datetime
+from sqlalchemy import select, update, insert
+from . import models
+
+TABLE = models.TableVersion.__table__
+
+
+def bump_table_version(connection, *table_names: str):
+    """
+    Marks one or more tables as reloaded. Works with either a Connection or a
+    Session, so the ingestion scripts can call it inside their own transaction.
+    """
+    for table_name in table_names:
+        result = connection.execute(
+            update(TABLE)
+            .where(TABLE.c.table_name == table_name)
+            .values(version=TABLE.c.version + 1, updated_at=datetime.utcnow())
+        )
+        if result.rowcount == 0:
+            connection.execute(
+                insert(TABLE).values(table_name=table_name, version=1, updated_at=datetime.utcnow())
+            )
+
+
+async def get_table_versions(db) -> dict[str, int]:
+    """Returns the current version of every tracked table (async session)."""
+    rows = (await db.execute(select(TABLE.c.table_name, TABLE.c.version))).all()
+    return {row.table_name: row.version for row in rows}
+
+
+class VersionWatcher:
+    """
+    Polls table_versions at most once every `interval` seconds and reports
+    which tables were reloaded since the previous poll.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._seen: dict[str, int] | None = None
+        self._checked_at = 0.0
+
+    async def poll(self, db) -> set[str]:
+        now = time.monotonic()
+        if now - self._checked_at < self.interval:
+            return set()
+        self._checked_at = now
+        versions = await get_table_versions(db)
+        if self._seen is None:
+            self._seen = versions
+            return set()
+        changed = {t for t in versions.keys() | self._seen.keys() if versions.get(t) != self._seen.get(t)}
+        self._seen = versions
+        return changed
@@ -0,0 +1,62 @@
+"""
+Fan-out search across every terminology for the unified /search endpoint.
+
+Each source is searched concurrently in its own task and database session.
+Sources that miss the latency budget, or fail, are reported instead of
+holding up the response, so callers always get whatever finished in time.
+"""
+import asyncio
+import os
+
+from . import crud
+from .database import AsyncSessionLocal
+
+# Upper bound (milliseconds) on how long /search waits for the slowest source.
+SEARCH_BUDGET_MS = int(os.getenv("SEARCH_BUDGET_MS", "250"))
+
+SEARCHERS = {
+    "namaste": crud.search_namaste_terms,
+    "icd11": crud.search_icd_terms,
+    "loinc": crud.search_loinc_terms,
+    "snomed": crud.search_snomed_terms,
+}
+
+
+async def _search_source(source: str, query: str, limit: int) -> list[dict]:
+    async with AsyncSessionLocal() as db:
+        results, _ = await SEARCHERS[source](db=db, query=query, limit=limit)
+    return [{**result, "source": source} for result in results]
+
+
+async def search_all(query: str, sources: list[str], per_source: int, budget_ms: int) -> dict:
+    """
+    Searches `sources` concurrently and merges their hits into one list ranked
+    by score, with at most `per_source` hits from each. Sources still running
+    when the budget expires are listed under 'timed_out'.
+    """
+    tasks = {
+        asyncio.create_task(_search_source(source, query, per_source)): source
+        for source in sources
+    }
+    done, pending = await asyncio.wait(tasks, timeout=budget_ms / 1000)
+    for task in pending:
+        task.cancel()
+
+    results, failed = [], []
+    for task in done:
+        if task.exception() is not None:
+            print(f"Search of '{tasks[task]}' failed: {task.exception()}")
+            failed.append(tasks[task])
+        else:
+            results.extend(task.result())
+
+    order = list(sources)
+    results.sort(key=lambda hit: (-hit["score"], order.index(hit["source"])))
+    timed_out = [tasks[task] for task in pending]
+    return {
+        "query": query,
+        "results": results,
+        "partial": bool(timed_out or failed),
+        "timed_out": sorted(timed_out, key=order.index),
+        "failed": sorted(failed, key=order.index),
+    }
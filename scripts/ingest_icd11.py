@@ -1,7 +1,8 @@
 import pandas as pd
 from sqlalchemy import create_engine
 from app.models import IcdTerm
-from app.database import Base
+from app.database import sync_schema
+from app.table_versions import bump_table_version
 import os
 import re
 
@@ -17,7 +18,7 @@ def clean_title(title):
 
 def ingest_icd11_data():
     engine = create_engine(DATABASE_URL)
-    Base.metadata.create_all(bind=engine)
+    sync_schema(engine)
     
     icd_csv_path = 'data/raw/icd11_data.csv'
     print(f"Reading ICD-11 data from {icd_csv_path}...")
@@ -34,6 +35,7 @@ def ingest_icd11_data():
             print("Ingesting ICD-11 terms into the database...")
             connection.execute(IcdTerm.__table__.delete())
             df.to_sql(IcdTerm.__tablename__, connection, if_exists='append', index=False)
+            bump_table_version(connection, IcdTerm.__tablename__)
         print("✅ ICD-11 data ingestion complete.")
 
 if __name__ == "__main__":
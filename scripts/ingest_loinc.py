@@ -1,7 +1,8 @@
 import pandas as pd
 from sqlalchemy import create_engine
 from app.models import LoincTerm
-from app.database import Base
+from app.database import sync_schema
+from app.table_versions import bump_table_version
 import os
 
 # --- THE FIX: Environment-aware database connection ---
@@ -11,7 +12,7 @@ DATABASE_URL = f"postgresql://ayush:hackathon_secret@{DB_HOST}/ayur_db"
 
 def ingest_loinc_data():
     engine = create_engine(DATABASE_URL)
-    Base.metadata.create_all(bind=engine)
+    sync_schema(engine)
     
     loinc_csv_path = 'data/raw/Loinc.csv'
     
@@ -34,6 +35,7 @@ def ingest_loinc_data():
                 print("Ingesting LOINC terms into the database...")
                 connection.execute(LoincTerm.__table__.delete())
                 df.to_sql(LoincTerm.__tablename__, connection, if_exists='append', index=False)
+                bump_table_version(connection, LoincTerm.__tablename__)
             print("✅ LOINC data ingestion complete.")
 
     except FileNotFoundError:
@@ -7,6 +7,7 @@ import pandas as pd
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
 from app.models import NamasteTerm, IcdTerm, ConceptMap
+from app.table_versions import bump_table_version
 
 # ... (Client ID/Secret and Config are unchanged) ...
 CLIENT_ID = "9753f1bd-4738-42c8-9081-963e1e8f8551_aa2b763e-6c0a-4d54-85e8-135fe144fcd0"
@@ -98,6 +99,7 @@ def ingest_map_from_csv(db_session):
     if new_maps:
         print(f"Ingesting {len(new_maps)} concept maps into the database...")
         db_session.bulk_insert_mappings(ConceptMap, new_maps)
+        bump_table_version(db_session, ConceptMap.__tablename__)
         db_session.commit()
         print("✅ Concept map ingestion complete.")
     else:
@@ -4,7 +4,9 @@ import os
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
 from app.models import NamasteTerm
-from app.database import Base
+from app.database import sync_schema
+from app.table_versions import bump_table_version
+from app.folding import build_search_keys
 
 # --- THE FIX: Environment-aware database connection ---
 DB_HOST = "db" if os.getenv("APP_ENV") == "docker" else "localhost"
@@ -25,37 +27,43 @@ def clean_namaste_code(code):
     else: return code.strip()
 
 def process_ayurveda(df):
-    df = df[['NAMC_CODE', 'NAMC_term_diacritical']].copy()
-    df.rename(columns={'NAMC_CODE': 'code', 'NAMC_term_diacritical': 'term'}, inplace=True)
+    # The Harvard-Kyoto (NAMC_term) and Devanagari spellings are kept only as search keys.
+    df = df[['NAMC_CODE', 'NAMC_term_diacritical', 'NAMC_term', 'NAMC_term_DEVANAGARI']].copy()
+    df.rename(columns={'NAMC_CODE': 'code', 'NAMC_term_diacritical': 'term', 'NAMC_term': 'term_hk', 'NAMC_term_DEVANAGARI': 'term_devanagari'}, inplace=True)
     df['system'] = 'ayurveda'
     df['code'] = df['code'].apply(clean_namaste_code)
     new_rows = []
     for _, row in df.iterrows():
         code = row['code']; term_string = str(row['term'])
+        spellings = (row['term_hk'], row['term_devanagari'])
         cleaned_terms = re.sub(r'\([a-z]\)\s*', '', term_string).strip()
         individual_terms = re.split(r'\s{2,}', cleaned_terms)
         for term in individual_terms:
-            if term and term.lower() != 'nan': new_rows.append({'code': code, 'term': term, 'system': 'ayurveda'})
-        if len(individual_terms) > 1: new_rows.append({'code': code, 'term': ' '.join(individual_terms), 'system': 'ayurveda'})
+            if term and term.lower() != 'nan': new_rows.append({'code': code, 'term': term, 'system': 'ayurveda', 'search_keys': build_search_keys(term, *spellings)})
+        if len(individual_terms) > 1:
+            joined = ' '.join(individual_terms)
+            new_rows.append({'code': code, 'term': joined, 'system': 'ayurveda', 'search_keys': build_search_keys(joined, *spellings)})
     return pd.DataFrame(new_rows)
 
 def process_siddha(df):
-    df = df[['NAMC_CODE', 'NAMC_TERM']].copy()
+    df = df[['NAMC_CODE', 'NAMC_TERM', 'Tamil_term']].copy()
     df.rename(columns={'NAMC_CODE': 'code', 'NAMC_TERM': 'term'}, inplace=True)
     df['system'] = 'siddha'
     df['code'] = df['code'].apply(clean_namaste_code)
-    return df
+    df['search_keys'] = [build_search_keys(term, tamil) for term, tamil in zip(df['term'], df['Tamil_term'])]
+    return df.drop(columns=['Tamil_term'])
 
 def process_unani(df):
-    df = df[['NUMC_CODE', 'NUMC_TERM']].copy()
+    df = df[['NUMC_CODE', 'NUMC_TERM', 'Arabic_term']].copy()
     df.rename(columns={'NUMC_CODE': 'code', 'NUMC_TERM': 'term'}, inplace=True)
     df['system'] = 'unani'
     df['code'] = df['code'].apply(clean_namaste_code)
-    return df
+    df['search_keys'] = [build_search_keys(term, arabic) for term, arabic in zip(df['term'], df['Arabic_term'])]
+    return df.drop(columns=['Arabic_term'])
 
 def run_pipeline():
     engine = create_engine(DATABASE_URL)
-    Base.metadata.create_all(bind=engine)
+    sync_schema(engine)
     
     try:
         print("Starting NAMASTE data preparation with intelligent parsing...")
@@ -68,7 +76,7 @@ def run_pipeline():
         combined_df = pd.concat([ayur_processed, siddha_processed, unani_processed], ignore_index=True)
         combined_df.dropna(subset=['code', 'term'], inplace=True)
         combined_df = combined_df[combined_df['term'].str.strip() != '']
-        combined_df.drop_duplicates(inplace=True)
+        combined_df.drop_duplicates(subset=['code', 'term', 'system'], inplace=True)
         
         print(f"Preparation complete. Found {len(combined_df)} unique NAMASTE terms.")
 
@@ -77,6 +85,7 @@ def run_pipeline():
                 print("Ingesting NAMASTE terms into the database...")
                 connection.execute(NamasteTerm.__table__.delete())
                 combined_df.to_sql(NamasteTerm.__tablename__, connection, if_exists='append', index=False)
+                bump_table_version(connection, NamasteTerm.__tablename__)
             print("✅ NAMASTE terms ingestion complete.")
             
     except Exception as e:
@@ -1,5 +1,7 @@
 import sys
 import os
+import json
+import pytest
 from fastapi.testclient import TestClient
 
 # Add the project root directory to the Python path
@@ -11,6 +13,16 @@ from app.main import app
 # This creates a special client that can call your API endpoints from within the code
 client = TestClient(app)
 
+@pytest.fixture(scope="module", autouse=True)
+def client_lifespan():
+    """
+    Keeps one event loop open for all tests: the async engine's pooled
+    connections belong to the loop they were opened on. This also runs the
+    app's startup (search index warm-up) once.
+    """
+    with client:
+        yield
+
 def test_health_check():
     """
     Tests the most basic endpoint to ensure the server is running.
@@ -44,6 +56,67 @@ def test_namaste_search():
     assert len(data) > 0
     assert data[0]["term"] == "vikāraḥ"
 
+def test_namaste_search_ignores_diacritics_and_script():
+    """
+    Tests that ASCII and Devanagari queries find terms stored with IAST diacritics.
+    """
+    for query in ("vyadhi-viniscayah", "व्याधि"):
+        response = client.get(f"/search/namaste?term={query}")
+        assert response.status_code == 200
+        terms = [item["term"] for item in response.json()]
+        assert "vyādhi-viniścayaḥ" in terms
+
+def test_namaste_search_pagination():
+    """
+    Tests that search results are capped by 'limit' and that the cursor
+    returned in X-Next-Cursor leads to the next, non-overlapping page.
+    """
+    first = client.get("/search/namaste?term=a&limit=5")
+    assert first.status_code == 200
+    first_page = first.json()
+    assert len(first_page) == 5
+    cursor = first.headers["X-Next-Cursor"]
+
+    second = client.get(f"/search/namaste?term=a&limit=5&cursor={cursor}")
+    assert second.status_code == 200
+    second_ids = {item["id"] for item in second.json()}
+    assert second_ids.isdisjoint({item["id"] for item in first_page})
+
+def test_search_rejects_bad_cursor():
+    response = client.get("/search/icd11?term=Cholera&cursor=not-a-cursor")
+    assert response.status_code == 400
+
+def test_unified_search():
+    """
+    Tests that /search merges hits from several terminologies into one
+    ranked list, tagging each hit with its source.
+    """
+    response = client.get("/search?term=Cholera&systems=icd11,namaste&per_system=3")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["partial"] is False
+    assert data["results"][0]["source"] == "icd11"
+    assert data["results"][0]["code"] == "1A00"
+    scores = [hit["score"] for hit in data["results"]]
+    assert scores == sorted(scores, reverse=True)
+
+def test_unified_search_rejects_unknown_system():
+    response = client.get("/search?term=fever&systems=icd10")
+    assert response.status_code == 400
+
+def test_lookup_is_served_from_cache():
+    """
+    Tests that a repeated $lookup is answered from the FHIR response cache.
+    """
+    url = "/fhir/CodeSystem/$lookup?system=icd11&code=1A00"
+    assert client.get(url).status_code == 200
+    hits_before = client.get("/cache/stats").json()["fhir_responses"]["hits"]
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.json()["parameter"][2]["valueString"] == "Cholera"
+    assert client.get("/cache/stats").json()["fhir_responses"]["hits"] == hits_before + 1
+
 def test_map_endpoint_not_found():
     """
     Tests that the mapping endpoint correctly returns a 404 error
@@ -52,6 +125,61 @@ def test_map_endpoint_not_found():
     response = client.get("/map?namaste_code=NON_EXISTENT&namaste_system=ayurveda")
     assert response.status_code == 404
 
+def test_maps_page_matches_count_and_walks_forward():
+    """
+    Tests that the keyset-paginated curation listing reports the same total
+    as /maps/count and that following next_cursor yields increasing ids.
+    """
+    count = client.get("/maps/count?status=reviewed").json()["total_count"]
+    first = client.get("/maps/page?status=reviewed&limit=3")
+    assert first.status_code == 200
+    data = first.json()
+    assert data["total_count"] == count
+    assert len(data["items"]) == min(3, count)
+
+    if data["next_cursor"]:
+        second = client.get(f"/maps/page?status=reviewed&limit=3&cursor={data['next_cursor']}").json()
+        assert second["total_count"] == count
+        assert second["items"][0]["id"] > data["items"][-1]["id"]
+
+def test_batch_translate_matches_single_translate():
+    """
+    Tests that POST $translate returns one NDJSON result per coding, in
+    input order, agreeing with the single-code GET $translate.
+    """
+    mapped = client.get("/maps/page?status=auto_generated&limit=1").json()["items"][0]["source_term"]
+    system = f"namaste_{mapped['system']}"
+    single = client.get(f"/fhir/ConceptMap/$translate?system={system}&code={mapped['code']}").json()
+    target = single["group"][0]["element"][0]["target"][0]
+
+    codings = [
+        {"system": system, "code": mapped["code"]},
+        {"system": "http://nph.gov.in/namaste/ayurveda", "code": "NON_EXISTENT"},
+        {"system": "icd11", "code": "1A00"},
+    ]
+    parameters = {"resourceType": "Parameters", "parameter": [{"name": "coding", "valueCoding": c} for c in codings]}
+    response = client.post("/fhir/ConceptMap/$translate", json=parameters)
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert len(results) == 3
+    outcomes = [{p["name"]: p for p in result["parameter"]} for result in results]
+    assert outcomes[0]["result"]["valueBoolean"] is True
+    concept = outcomes[0]["match"]["part"][1]["valueCoding"]
+    assert (concept["code"], concept["display"]) == (target["code"], target["display"])
+    assert outcomes[1]["result"]["valueBoolean"] is False
+    assert outcomes[2]["result"]["valueBoolean"] is False
+
+    ndjson = "\n".join(json.dumps(c) for c in codings) + "\nnot json\n"
+    streamed = client.post("/fhir/ConceptMap/$translate", content=ndjson,
+                           headers={"Content-Type": "application/x-ndjson"})
+    lines = streamed.text.splitlines()
+    assert [json.loads(line) for line in lines[:3]] == results
+    assert len(lines) == 4
+
+def test_batch_translate_rejects_non_parameters():
+    response = client.post("/fhir/ConceptMap/$translate", json={"resourceType": "Bundle"})
+    assert response.status_code == 400
+
 # You can add a test for a successful map once you have a known mapping
 # in your 'build_live_map.py' or a manual mapping file.
 # def test_map_endpoint_success():